@@ -3,16 +3,21 @@
 What this does:
 - Connects to the Hub (uses the existing token/ip from the previous file).
 - Finds the environment sensor with custom name "Raumtemperatursensor".
-- Reads temperature and relative humidity every 2 minutes and appends to a JSON file.
+- Reads temperature and relative humidity every 2 minutes and appends to a JSON Lines file.
 - After 24 hours (since start), creates a line plot PNG and starts a fresh cycle.
 - On KeyboardInterrupt, writes final plot and exits cleanly.
 
 Notes:
-- Stores data in JSON (simple, builtin). JSON is suitable for numeric time series and is
-  easy to inspect and interoperate with other tools. YAML is more human-friendly but
-  adds an external dependency (PyYAML). If you prefer YAML, I can switch.
+- Stores data as newline-delimited JSON (JSONL, one reading object per line). Appending a
+  line is constant time per sample, whereas a single JSON array has to be read, parsed and
+  rewritten in full on every sample. Each line is still plain JSON, so the files remain easy
+  to inspect and interoperate with other tools.
+- Once a cycle is complete its JSONL file is converted to a zstd-compressed Parquet file
+  with the same name. The columnar, binary format is several times smaller and lets the
+  dashboard read just the time range it needs without parsing every reading.
 """
 
+import io
 import json
 import os
 import time
@@ -21,9 +26,13 @@ import tempfile
 import shutil
 import logging
 
+import numpy as np
 import matplotlib
 matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 import dirigera
 
@@ -31,6 +40,76 @@ LOGGER = logging.getLogger("dirigera_logger")
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 
 
+# Column layout of the Parquet files that completed cycles are archived to
+PARQUET_SCHEMA = pa.schema(
+    [
+        ("ts", pa.string()),
+        ("temperature_c", pa.float64()),
+        ("humidity_rh", pa.float64()),
+        ("battery_percentage", pa.float64()),
+    ]
+)
+
+# Upper bound on the number of points plot_day draws per series
+MAX_PLOT_POINTS = 2000
+
+# Resolution of the plot PNGs
+PLOT_DPI = 120
+
+# Figures for plot_day, created on first use and reused across cycles. They are
+# attached to their own Agg canvas rather than managed by pyplot, and rendered at
+# their native dpi so the canvas can keep its RGBA buffer between cycles.
+_TEMP_FIG = None
+_PWR_FIG = None
+_PNG_BUFFER = io.BytesIO()
+
+
+def _new_fig(figsize) -> Figure:
+    fig = Figure(figsize=figsize, dpi=PLOT_DPI)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _save_png(fig: Figure, path: str):
+    """Render `fig` into the reused PNG buffer and write the bytes to `path`."""
+    _PNG_BUFFER.seek(0)
+    _PNG_BUFFER.truncate()
+    fig.canvas.print_png(_PNG_BUFFER)
+    with open(path, "wb") as f:
+        f.write(_PNG_BUFFER.getbuffer())
+
+
+def _get_temp_fig():
+    """Return the cached (fig, ax1, ax2) for the temperature/humidity plot, cleared."""
+    global _TEMP_FIG
+    if _TEMP_FIG is None:
+        fig = _new_fig((12, 5))
+        ax1 = fig.subplots()
+        ax2 = ax1.twinx()
+        _TEMP_FIG = (fig, ax1, ax2)
+        return _TEMP_FIG
+
+    fig, ax1, ax2 = _TEMP_FIG
+    ax1.cla()
+    ax2.cla()
+    # cla() resets the twin axis to the left-hand side
+    ax2.yaxis.tick_right()
+    ax2.yaxis.set_label_position("right")
+    return _TEMP_FIG
+
+
+def _get_pwr_fig():
+    """Return the cached (fig, ax) for the battery plot, cleared."""
+    global _PWR_FIG
+    if _PWR_FIG is None:
+        fig = _new_fig((12, 4))
+        _PWR_FIG = (fig, fig.subplots())
+        return _PWR_FIG
+
+    _PWR_FIG[1].cla()
+    return _PWR_FIG
+
+
 def find_sensor(hub: dirigera.Hub, name: str):
     """Return the first environment sensor whose custom_name matches `name`.
 
@@ -51,6 +130,19 @@ def find_sensor(hub: dirigera.Hub, name: str):
     return None
 
 
+def refresh_sensor(hub: dirigera.Hub, sensor, name: str):
+    """Return an up-to-date copy of `sensor`, fetched from the hub by its id.
+
+    If the by-id fetch fails (e.g. the device was re-paired and got a new id), falls back to
+    looking the sensor up by `name` with `find_sensor`. Returns None if that fails too.
+    """
+    try:
+        return hub.get_environment_sensor_by_id(sensor.id)
+    except Exception:
+        LOGGER.warning("Failed to fetch sensor %s by id, looking it up by name", sensor.id)
+        return find_sensor(hub, name)
+
+
 def read_sensor_values(sensor) -> dict:
     """Read temperature and humidity from a sensor object and return a dict.
 
@@ -82,69 +174,162 @@ def atomic_write_json(path: str, data):
             json.dump(data, f, ensure_ascii=False, indent=2)
         shutil.move(tmp, path)
     finally:
-        if os.path.exists(tmp):
-            try:
-                os.remove(tmp)
-            except Exception:
-                pass
+        # After a successful move there is nothing to clean up (FileNotFoundError)
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
 
 
 def append_reading(path: str, reading: dict):
-    # load existing or start new list
-    if os.path.exists(path):
-        try:
-            with open(path, "r") as f:
-                payload = json.load(f)
-        except Exception:
-            LOGGER.exception("Failed to read existing JSON, starting fresh")
-            payload = []
-    else:
-        payload = []
+    """Append one reading as a single JSON line to `path`."""
+    dname = os.path.dirname(path)
+    if dname:
+        os.makedirs(dname, exist_ok=True)
+    with open(path, "a", buffering=1) as f:
+        f.write(json.dumps(reading, ensure_ascii=False) + "\n")
+
+
+def iter_readings(path: str):
+    """Yield the reading dicts stored in the JSONL file at `path`.
+
+    Blank lines and lines that fail to parse (e.g. a partially written last line after a
+    crash) are skipped.
+    """
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                LOGGER.warning("Skipping malformed line in %s", path)
 
-    payload.append(reading)
-    atomic_write_json(path, payload)
+
+def archive_cycle(json_path: str):
+    """Convert a completed cycle's JSONL file to Parquet and remove the JSONL file.
+
+    The Parquet file gets the same name with a ".parquet" extension. If the conversion
+    fails the JSONL file is kept, so no readings are lost.
+    """
+    parquet_path = os.path.splitext(json_path)[0] + ".parquet"
+    tmp_path = parquet_path + ".tmp"
+    try:
+        rows = list(iter_readings(json_path))
+    except FileNotFoundError:
+        # No reading was recorded in this cycle
+        return
+    except Exception:
+        LOGGER.exception("Failed to read %s for archiving, keeping JSONL", json_path)
+        return
+    try:
+        table = pa.Table.from_pylist(rows, schema=PARQUET_SCHEMA)
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, parquet_path)
+    except Exception:
+        LOGGER.exception("Failed to archive %s to Parquet, keeping JSONL", json_path)
+        return
+    os.remove(json_path)
+    LOGGER.info("Archived %s to %s", json_path, parquet_path)
+
+
+def _to_arrays(data: list):
+    """Convert reading dicts to (times, temps, hums, pwr) arrays in a single pass.
+
+    Each column is allocated once, sized for all rows, and filled in place; rows without a
+    timestamp are skipped and the arrays trimmed to the rows kept. Missing values become NaN.
+    Raises ValueError if a timestamp cannot be parsed.
+    """
+    n = len(data)
+    # "YYYY-MM-DDTHH:MM:SS"; datetime64 has no notion of time zones, so the UTC "Z" is dropped
+    ts = np.empty(n, dtype="U19")
+    temps = np.full(n, np.nan)
+    hums = np.full(n, np.nan)
+    pwr = np.full(n, np.nan)
+    k = 0
+    for row in data:
+        t = row.get("ts")
+        if not isinstance(t, str):
+            continue
+        ts[k] = t.rstrip("Z")
+        v = row.get("temperature_c")
+        if v is not None:
+            temps[k] = v
+        v = row.get("humidity_rh")
+        if v is not None:
+            hums[k] = v
+        v = row.get("battery_percentage")
+        if v is not None:
+            pwr[k] = v
+        k += 1
+    return ts[:k].astype("datetime64[s]"), temps[:k], hums[:k], pwr[:k]
+
+
+def downsample(t: np.ndarray, y: np.ndarray, target: int = MAX_PLOT_POINTS):
+    """Reduce the series (t, y) to `target` points with Largest-Triangle-Three-Buckets.
+
+    LTTB keeps the first and last point and, from each of `target - 2` equally sized
+    buckets in between, the point forming the largest triangle with the previously kept
+    point and the average of the next bucket, which preserves peaks and dips. Missing
+    (NaN) values are dropped before downsampling. Series with at most `target` points
+    are returned unchanged.
+    """
+    if len(t) <= target or target < 3:
+        return t, y
+    valid = ~np.isnan(y)
+    t, y = t[valid], y[valid]
+    n = len(t)
+    if n <= target:
+        return t, y
+
+    x = t.astype("int64").astype(np.float64)
+    edges = np.linspace(1, n - 1, target - 1).astype(np.int64)
+    idx = np.empty(target, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(target - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket; for the last bucket that is the final point
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return t[idx], y[idx]
 
 
 def plot_day(json_path: str, png_path: str):
-    if not os.path.exists(json_path):
+    try:
+        data = list(iter_readings(json_path))
+    except FileNotFoundError:
         LOGGER.warning("No data file to plot: %s", json_path)
         return
-    try:
-        with open(json_path, "r") as f:
-            data = json.load(f)
     except Exception:
-        LOGGER.exception("Failed to load JSON for plotting")
+        LOGGER.exception("Failed to load JSONL for plotting")
         return
 
     if not data:
         LOGGER.info("Data file empty, skipping plot: %s", json_path)
         return
 
-    times = []
-    temps = []
-    hums = []
-    pwr = []
-    for row in data:
-        try:
-            times.append(datetime.fromisoformat(row["ts"].replace("Z", "")))
-            temps.append(row.get("temperature_c"))
-            hums.append(row.get("humidity_rh"))
-            pwr.append(row.get("battery_percentage"))
-        except Exception:
-            continue
-
-    if not times:
+    try:
+        times, temps, hums, pwr = _to_arrays(data)
+    except ValueError:
+        LOGGER.exception("Invalid timestamp in data, skipping plot")
+        return
+    # Rows without a timestamp cannot be placed on the time axis
+    if not len(times):
         LOGGER.info("No valid timestamps in data, skipping plot")
         return
 
-    fig, ax1 = plt.subplots(figsize=(12, 5))
-    ax1.plot(times, temps, color="tab:red", label="Temperature (°C)")
+    fig, ax1, ax2 = _get_temp_fig()
+    ax1.plot(*downsample(times, temps), color="tab:red", label="Temperature (°C)", rasterized=True)
     ax1.set_xlabel("time")
     ax1.set_ylabel("Temperature (°C)", color="tab:red")
     ax1.tick_params(axis="y", labelcolor="tab:red")
 
-    ax2 = ax1.twinx()
-    ax2.plot(times, hums, color="tab:blue", label="Humidity (%RH)")
+    ax2.plot(*downsample(times, hums), color="tab:blue", label="Humidity (%RH)", rasterized=True)
     ax2.set_ylabel("Relative Humidity (%)", color="tab:blue")
     ax2.tick_params(axis="y", labelcolor="tab:blue")
 
@@ -154,17 +339,16 @@ def plot_day(json_path: str, png_path: str):
     if dname:
         os.makedirs(dname, exist_ok=True)
     # tmp_png = png_path + ".png"
-    fig.savefig(png_path)
-    # plt.close(fig)
+    _save_png(fig, png_path)
     # shutil.move(tmp_png, png_path)
     LOGGER.info("Wrote plot: %s", png_path)
 
     # Plot battery percentage on its own figure (filter out missing values)
-    pwr_pairs = [(t, v) for t, v in zip(times, pwr) if v is not None]
-    if pwr_pairs:
-        pwr_times, pwr_vals = zip(*pwr_pairs)
-        fig_pwr, ax_pwr = plt.subplots(figsize=(12, 4))
-        ax_pwr.plot(pwr_times, pwr_vals, color="tab:red", label="Battery Percentage (%)")
+    pwr_valid = ~np.isnan(pwr)
+    if pwr_valid.any():
+        pwr_times, pwr_vals = times[pwr_valid], pwr[pwr_valid]
+        fig_pwr, ax_pwr = _get_pwr_fig()
+        ax_pwr.plot(*downsample(pwr_times, pwr_vals), color="tab:red", label="Battery Percentage (%)", rasterized=True)
         ax_pwr.set_xlabel("time")
         ax_pwr.set_ylabel("Battery Percentage (%)", color="tab:red")
         ax_pwr.tick_params(axis="y", labelcolor="tab:red")
@@ -173,13 +357,27 @@ def plot_day(json_path: str, png_path: str):
         # save atomically
         filename = os.path.basename(png_path)
         png_path_pwr = os.path.join(os.path.dirname(png_path), f"pwr_{filename}")
-        fig_pwr.savefig(png_path_pwr)
-        plt.close(fig_pwr)
+        _save_png(fig_pwr, png_path_pwr)
         LOGGER.info("Wrote plot: %s", png_path_pwr)
     else:
         LOGGER.info("No battery data available, skipping battery plot")
 
 
+def wait_for_next_tick(tick: float, interval_seconds: float) -> float:
+    """Sleep until `tick + interval_seconds` on the monotonic clock and return that tick.
+
+    Keeps sampling on a fixed schedule instead of drifting by the time each iteration takes.
+    If the schedule fell behind by more than an interval (e.g. a very slow hub call), the
+    missed ticks are skipped rather than sampled in a burst.
+    """
+    tick += interval_seconds
+    now = time.monotonic()
+    if tick < now:
+        tick += ((now - tick) // interval_seconds + 1) * interval_seconds
+    time.sleep(tick - now)
+    return tick
+
+
 def main_loop(
     token: str,
     ip_address: str,
@@ -191,11 +389,12 @@ def main_loop(
     hub = dirigera.Hub(token=token, ip_address=ip_address)
 
     cycle_start = datetime.utcnow()
-    json_path = f"data/sensor_{cycle_start.strftime('%Y%m%d_%H%M%S')}.json"
+    json_path = f"data/sensor_{cycle_start.strftime('%Y%m%d_%H%M%S')}.jsonl"
     LOGGER.info("Starting logging cycle: %s", json_path)
 
     # Attempt to find sensor; if not present, will retry each loop
     sensor = None
+    tick = time.monotonic()
 
     try:
         while True:
@@ -204,17 +403,20 @@ def main_loop(
                 sensor = find_sensor(hub, sensor_name)
                 if sensor is None:
                     LOGGER.warning("Sensor '%s' not found, retrying in %s seconds", sensor_name, interval_seconds)
-                    time.sleep(interval_seconds)
+                    tick = wait_for_next_tick(tick, interval_seconds)
                     continue
 
-            try:
-                # Fetch latest sensor object (some libraries provide live objects; re-query to be safe)
-                sensor = find_sensor(hub, sensor_name) or sensor
-                reading = read_sensor_values(sensor)
-                append_reading(json_path, reading)
-                LOGGER.info("Appended reading: %s", reading)
-            except Exception:
-                LOGGER.exception("Failed to read/append sensor data")
+            # Sensor objects are snapshots; fetch the current state of this one device
+            sensor = refresh_sensor(hub, sensor, sensor_name)
+            if sensor is None:
+                LOGGER.warning("Sensor '%s' no longer found, skipping reading", sensor_name)
+            else:
+                try:
+                    reading = read_sensor_values(sensor)
+                    append_reading(json_path, reading)
+                    LOGGER.info("Appended reading: %s", reading)
+                except Exception:
+                    LOGGER.exception("Failed to read/append sensor data")
 
             # if cycle age >= seconds_per_cycle, produce plot and start new cycle
             if (now - cycle_start).total_seconds() >= seconds_per_cycle:
@@ -222,18 +424,20 @@ def main_loop(
                 LOGGER.info("Cycle complete (>= %s sec). Plotting to %s", seconds_per_cycle, png_path)
                 if store_plots:
                     plot_day(json_path, png_path)
+                archive_cycle(json_path)
                 # rotate: start new files
                 cycle_start = datetime.utcnow()
-                json_path = f"data/sensor_{cycle_start.strftime('%Y%m%d_%H%M%S')}.json"
+                json_path = f"data/sensor_{cycle_start.strftime('%Y%m%d_%H%M%S')}.jsonl"
                 LOGGER.info("Starting new cycle: %s", json_path)
 
-            time.sleep(interval_seconds)
+            tick = wait_for_next_tick(tick, interval_seconds)
 
     except KeyboardInterrupt:
         LOGGER.info("Interrupted by user, producing final plot and exiting")
         if store_plots:
             png_path = f"plots/sensor_{cycle_start.strftime('%Y%m%d_%H%M%S')}_final.png"
             plot_day(json_path, png_path)
+        archive_cycle(json_path)
 
 
 if __name__ == "__main__":
@@ -1,79 +1,262 @@
 import os
-import json
+import bisect
+import heapq
+import threading
+from operator import itemgetter
 from datetime import datetime, timedelta
-from flask import Flask, render_template, jsonify, request
+import orjson
+import pyarrow.parquet as pq
+from flask import Flask, render_template, request
+from flask_compress import Compress
 
 app = Flask(__name__)
 
+# Compress responses; the highly repetitive readings JSON shrinks very well
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 1024
+Compress(app)
+
 # CONFIGURATION
 DATA_FOLDER = 'data'  # Make sure this matches your Docker volume or local path
 
-def load_data(start_dt, end_dt):
+# Fields of a reading, as written by the collector
+READING_FIELDS = ('ts', 'temperature_c', 'humidity_rh', 'battery_percentage')
+
+# Cached, date-sorted index of the data files. It is rebuilt only when the
+# mtime of DATA_FOLDER changes, i.e. when a file is created, renamed or removed.
+_FILE_INDEX = []      # list of (date, filename) tuples, sorted
+_INDEX_DATES = []     # the date of each _FILE_INDEX entry, for bisecting
+_INDEX_MTIME = None
+
+# Cached (first_ts, last_ts) of each data file, keyed by filename. An entry is
+# only valid for the file size and mtime it was computed for, since the file of
+# the current cycle keeps growing.
+_TS_RANGES = {}       # filename -> (size, mtime, first_ts, last_ts)
+
+# Serialized /api/get_readings responses, keyed on the request arguments and
+# the state of the data files (see data_version). Cleared on index rebuilds.
+_CACHE = {}           # (range, date, data version) -> bytes
+_CACHE_SIZE = 32
+_CACHE_LOCK = threading.Lock()
+
+def iter_readings(filepath, start_iso=None, end_iso=None):
     """
-    Scans the data folder for files matching 'sensor_YYYYMMDD_HHMMSS.json'
-    and loads those that fall within the requested time window.
+    Yields the reading dicts stored in a data file.
+    Completed cycles are archived as Parquet ('.parquet'); for those, the optional
+    [start_iso, end_iso] timestamp range is pushed down into the scan so row groups
+    outside of it are skipped. The current cycle is JSON Lines ('.jsonl', one object
+    per line) and files written by older collector versions ('.json') hold a single
+    JSON array; both are read in full.
     """
-    combined_data = []
-    
-    # 1. Get all files in the folder
-    if not os.path.exists(DATA_FOLDER):
-        print(f"Warning: Folder {DATA_FOLDER} does not exist.")
-        return []
-        
-    all_files = os.listdir(DATA_FOLDER)
-    relevant_files = []
+    if filepath.endswith('.parquet'):
+        filters = []
+        if start_iso is not None:
+            filters.append(('ts', '>=', start_iso))
+        if end_iso is not None:
+            filters.append(('ts', '<=', end_iso))
+        yield from pq.read_table(filepath, filters=filters or None).to_pylist()
+        return
+    with open(filepath, 'rb') as f:
+        if filepath.endswith('.json'):
+            yield from orjson.loads(f.read())
+            return
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield orjson.loads(line)
+            except ValueError:
+                # A partially written last line is expected while the collector appends
+                continue
 
-    # 2. Filter files based on the date in the filename
-    # We look for files starting from (start_date - 1 day) to handle files 
-    # that started yesterday but contain data for today.
-    search_start_date = (start_dt - timedelta(days=1)).date()
-    search_end_date = end_dt.date()
+def _first_ts(lines):
+    """
+    Returns the timestamp of the first parseable reading in an iterable of JSON lines.
+    """
+    for line in lines:
+        try:
+            return orjson.loads(line)['ts']
+        except (ValueError, KeyError, TypeError):
+            continue
+    return None
+
+def read_ts_range(filepath):
+    """
+    Returns (first_ts, last_ts) of the readings in a data file without reading all
+    of it where possible, or None if it cannot be determined.
+    """
+    if filepath.endswith('.parquet'):
+        # The min/max statistics in the footer give the range for free
+        metadata = pq.ParquetFile(filepath).metadata
+        column = metadata.schema.to_arrow_schema().get_field_index('ts')
+        stats = [metadata.row_group(i).column(column).statistics for i in range(metadata.num_row_groups)]
+        if not stats or any(st is None or not st.has_min_max for st in stats):
+            return None
+        return min(st.min for st in stats), max(st.max for st in stats)
+
+    if filepath.endswith('.json'):
+        # Legacy files are a single array and have to be parsed in full
+        readings = list(iter_readings(filepath))
+        if not readings:
+            return None
+        return readings[0]['ts'], readings[-1]['ts']
 
-    for filename in sorted(all_files):
-        # Expecting format: sensor_20251120_214032.json
-        if filename.startswith('sensor_') and filename.endswith('.json'):
+    with open(filepath, 'rb') as f:
+        first_ts = _first_ts(f)
+        if first_ts is None:
+            return None
+        # Read backwards from the end of the file until a complete line parses
+        pos = f.seek(0, os.SEEK_END)
+        tail = b''
+        while pos > 0:
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+            lines = tail.split(b'\n')
+            # Unless we reached the start of the file, the first line may be cut off
+            last_ts = _first_ts(reversed(lines if pos == 0 else lines[1:]))
+            if last_ts is not None:
+                return first_ts, last_ts
+    return None
+
+def get_ts_range(filename):
+    """
+    Returns the cached (first_ts, last_ts) of a data file, recomputing it if the
+    file changed. Returns None if the range is unknown.
+    """
+    filepath = os.path.join(DATA_FOLDER, filename)
+    try:
+        st = os.stat(filepath)
+        cached = _TS_RANGES.get(filename)
+        if cached is not None and cached[:2] == (st.st_size, st.st_mtime):
+            ts_range = cached[2:]
+        else:
+            ts_range = read_ts_range(filepath)
+            _TS_RANGES[filename] = (st.st_size, st.st_mtime) + (ts_range or (None, None))
+    except Exception as e:
+        app.logger.error("Error reading timestamp range of %s: %s", filename, e)
+        return None
+    return None if ts_range[0] is None else ts_range
+
+def get_file_index():
+    """
+    Returns the cached (_FILE_INDEX, _INDEX_DATES) pair, rebuilding it from a
+    single scan of DATA_FOLDER if the folder changed since the last call.
+    Returns None if the folder does not exist.
+    """
+    global _FILE_INDEX, _INDEX_DATES, _INDEX_MTIME, _TS_RANGES, _CACHE
+
+    try:
+        mtime = os.stat(DATA_FOLDER).st_mtime
+    except FileNotFoundError:
+        return None
+
+    if mtime != _INDEX_MTIME:
+        index = []
+        with os.scandir(DATA_FOLDER) as entries:
+            filenames = {entry.name for entry in entries}
+        for filename in filenames:
+            # Expecting format: sensor_20251120_214032.parquet (or .jsonl / legacy .json)
+            if not (filename.startswith('sensor_') and filename.endswith(('.parquet', '.jsonl', '.json'))):
+                continue
+            # While a cycle is being archived both files exist briefly; prefer the Parquet one
+            if filename.endswith('.jsonl') and filename[:-len('.jsonl')] + '.parquet' in filenames:
+                continue
             try:
                 # Extract the date part (e.g., "20251120")
-                # Split by '_' gives: ['sensor', '20251120', '214032.json']
+                # Split by '_' gives: ['sensor', '20251120', '214032.jsonl']
                 date_part = filename.split('_')[1]
                 file_date = datetime.strptime(date_part, "%Y%m%d").date()
-
-                # Check if this file is within our interest window
-                if search_start_date <= file_date <= search_end_date:
-                    relevant_files.append(filename)
-            except (IndexError, ValueError) as e:
+            except (IndexError, ValueError):
                 # Skip files that don't match the expected format
-                print(f"Error: {e} - Skipping unrecognized file format: {filename}")
+                app.logger.debug("Skipping unrecognized file format: %s", filename)
                 continue
+            index.append((file_date, filename))
+
+        index.sort()
+        _FILE_INDEX = index
+        _INDEX_DATES = [file_date for file_date, _ in index]
+        _INDEX_MTIME = mtime
+        # Forget the ranges of files that are gone, e.g. archived JSONL files
+        _TS_RANGES = {name: r for name, r in _TS_RANGES.items() if name in filenames}
+        with _CACHE_LOCK:
+            _CACHE = {}
+
+    return _FILE_INDEX, _INDEX_DATES
+
+def data_version():
+    """
+    Returns a value that changes whenever the data on disk changes: the folder
+    mtime (files added or removed) plus the size and mtime of the newest file,
+    which is the one the collector appends to. Returns None if there is no data.
+    """
+    file_index = get_file_index()
+    if not file_index or not file_index[0]:
+        return None
+    newest = file_index[0][-1][1]
+    try:
+        st = os.stat(os.path.join(DATA_FOLDER, newest))
+    except FileNotFoundError:
+        return None
+    return _INDEX_MTIME, newest, st.st_size, st.st_mtime
+
+def load_data(start_dt, end_dt):
+    """
+    Looks up the files matching 'sensor_YYYYMMDD_HHMMSS.parquet' (or '.jsonl' /
+    legacy '.json') in the cached file index and yields the readings from those files
+    that fall within the requested time window, in chronological order.
+    """
+    # 1. Get the (cached) index of all files in the folder
+    file_index = get_file_index()
+    if file_index is None:
+        app.logger.warning("Folder %s does not exist.", DATA_FOLDER)
+        return
+    files, dates = file_index
 
-    # 3. Load data from identified files
-    for filename in relevant_files:
+    # 2. Select files based on the date in the filename
+    # We look for files starting from (start_date - 1 day) to handle files 
+    # that started yesterday but contain data for today.
+    search_start_date = (start_dt - timedelta(days=1)).date()
+    search_end_date = end_dt.date()
+
+    lo = bisect.bisect_left(dates, search_start_date)
+    hi = bisect.bisect_right(dates, search_end_date)
+
+    # Timestamps look like "2025-11-20T21:40:32Z"; in this fixed-width format
+    # lexicographic order equals chronological order, so no parsing is needed.
+    # The bounds are built the same way the collector formats its timestamps.
+    start_iso = start_dt.replace(microsecond=0).isoformat() + "Z"
+    end_iso = end_dt.replace(microsecond=0).isoformat() + "Z"
+
+    # Skip files whose [first, last] timestamps do not overlap the requested range
+    relevant_files = []
+    for _, filename in files[lo:hi]:
+        ts_range = get_ts_range(filename)
+        if ts_range is None or (ts_range[0] <= end_iso and ts_range[1] >= start_iso):
+            relevant_files.append(filename)
+
+    # 3. Stream data from identified files. The collector appends readings in
+    # chronological order, so every file is already sorted and a k-way merge
+    # yields one sorted stream without a separate sort pass.
+    def read_file(filename):
         filepath = os.path.join(DATA_FOLDER, filename)
         try:
-            with open(filepath, 'r') as f:
-                day_data = json.load(f)
-                combined_data.extend(day_data)
+            yield from iter_readings(filepath, start_iso, end_iso)
         except Exception as e:
-            print(f"Error reading {filename}: {e}")
+            app.logger.error("Error reading %s: %s", filename, e)
+
+    merged = heapq.merge(*(read_file(f) for f in relevant_files), key=itemgetter('ts'))
 
     # 4. Filter exact data points by timestamp
-    filtered_data = []
-    for entry in combined_data:
-        try:
-            # Parse timestamp from JSON content: "2025-11-20T21:40:32Z"
-            entry_ts = datetime.strptime(entry['ts'], "%Y-%m-%dT%H:%M:%SZ")
-            # Keep only points strictly within the requested range
-            if start_dt <= entry_ts <= end_dt:
-                print(f"Adding entry with timestamp {entry_ts}")
-                filtered_data.append(entry)
-        except ValueError:
-            print(f"Invalid timestamp format in entry: {entry}")
-            continue
-            
-    # Sort by timestamp to ensure the chart draws lines correctly
-    filtered_data.sort(key=lambda x: x['ts'])
-            
-    return filtered_data
+    for entry in merged:
+        entry_ts = entry['ts']
+        if entry_ts > end_iso:
+            break
+        # Keep only points strictly within the requested range
+        if entry_ts >= start_iso:
+            yield entry
 
 @app.route('/')
 def index():
@@ -86,7 +269,7 @@ def get_readings():
 
     # Calculate End Time
     if ref_date_str:
-        end_time = datetime.strptime(ref_date_str, "%Y-%m-%d")
+        end_time = datetime.fromisoformat(ref_date_str)
         if end_time.date() == datetime.today().date():
             end_time = datetime.utcnow()
         else:
@@ -110,8 +293,28 @@ def get_readings():
     else:
         start_time = end_time - timedelta(hours=24)
 
-    data = load_data(start_time, end_time)
-    return jsonify(data)
+    # Identical requests are answered from the cache until the data changes
+    version = data_version()
+    cache_key = (time_range, ref_date_str, version)
+    body = _CACHE.get(cache_key) if version is not None else None
+    if body is None:
+        # Return one array per field instead of one object per reading, so the keys
+        # are not repeated for every data point
+        columns = {key: [] for key in READING_FIELDS}
+        for entry in load_data(start_time, end_time):
+            for key, values in columns.items():
+                values.append(entry.get(key))
+        body = orjson.dumps(columns)
+
+        if version is not None:
+            with _CACHE_LOCK:
+                while len(_CACHE) >= _CACHE_SIZE:
+                    # Evict the oldest entry
+                    del _CACHE[next(iter(_CACHE))]
+                _CACHE[cache_key] = body
+
+    return app.response_class(body, mimetype='application/json')
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Development server only; the container runs the app under gunicorn
+    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file